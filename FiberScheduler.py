@@ -1,9 +1,14 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import heapq
+import itertools
 import time
 import threading
 from MiscLib import *
 
-@dataclass
+# Fibers registered without an interval are re-run at this period (seconds)
+DEFAULT_FIBER_INTERVAL = 0.10
+
+@dataclass(slots=True)
 class FiberInfo:
     fiber_name        : str
     fiber             : callable
@@ -11,56 +16,121 @@ class FiberInfo:
     interval          : int
     activation_status : bool
     running_status    : bool
+    stopped_event     : threading.Event = field(default_factory=threading.Event)
+    scheduled         : bool = False
+    last_trigger_time : float = None
 
 class FiberScheduler:
     def __init__(self):
         self.fiber_list       = {}
-        self.fiber_last_trigger_time = {}
         self.is_running              = False
+        # Min-heap of (next trigger time, sequence, FiberInfo), guarded by cond.
+        # The sequence number breaks deadline ties so FiberInfo is never compared.
+        self.ready_heap              = []
+        self.heap_sequence           = itertools.count()
+        self.cond                    = threading.Condition()
+        self.fiber_scheduler_thread  = None
 
     def RegisterFiber(self, fiber, args=None, interval=None, activation_status=False):
-        self.fiber_list[fiber.__name__] = FiberInfo(fiber.__name__, fiber, args, interval, activation_status, False)
+        fiber_info = FiberInfo(fiber.__name__, fiber, args, interval, activation_status, False)
+        # The event is set whenever the fiber is not executing
+        fiber_info.stopped_event.set()
+        with self.cond:
+            previous_info = self.fiber_list.get(fiber.__name__)
+            if previous_info is not None:
+                # Any heap entry still queued for the replaced fiber is dropped when popped
+                previous_info.activation_status = False
+            self.fiber_list[fiber.__name__] = fiber_info
+            if activation_status:
+                self._ScheduleFiber(fiber_info, time.monotonic())
 
     def ActivateFiber(self, fiber):
-        self.fiber_list[fiber.__name__].activation_status = True
+        with self.cond:
+            fiber_info = self.fiber_list[fiber.__name__]
+            fiber_info.activation_status = True
+            self._ScheduleFiber(fiber_info, time.monotonic())
         DebugLog(LOG_DEBUG, 'Activated fiber {}'.format(fiber.__name__))
 
     def DeactivateFiber(self, fiber):
-        while(self.IsFiberRunning(fiber)):
-            pass
-        self.fiber_list[fiber.__name__].activation_status = False
+        with self.cond:
+            fiber_info = self.fiber_list[fiber.__name__]
+            fiber_info.activation_status = False
+        # Block until the scheduler finishes the current run, if any
+        fiber_info.stopped_event.wait()
         DebugLog(LOG_DEBUG, 'Deactivated fiber {}'.format(fiber.__name__))
 
     def IsFiberRunning(self, fiber):
         return self.fiber_list[fiber.__name__].running_status
 
+    def _ScheduleFiber(self, fiber_info, now):
+        # Must be called with self.cond held
+        if fiber_info.scheduled:
+            return
+        if fiber_info.interval is not None:
+            # First run happens one interval after the fiber is first seen
+            if fiber_info.last_trigger_time is None:
+                fiber_info.last_trigger_time = now
+            deadline = fiber_info.last_trigger_time + fiber_info.interval
+        elif fiber_info.last_trigger_time is not None:
+            deadline = fiber_info.last_trigger_time + DEFAULT_FIBER_INTERVAL
+        else:
+            deadline = now
+        heapq.heappush(self.ready_heap, (deadline, next(self.heap_sequence), fiber_info))
+        fiber_info.scheduled = True
+        self.cond.notify()
+
     def RunFiberLoop(self):
-        self.is_running = True
-        while(self.is_running):
-            for fiber_name, fiber_info in self.fiber_list.items():
-                if (self.is_running == False):
+        # Runs the scheduler on the calling thread until Stop() is called
+        with self.cond:
+            self.is_running = True
+        self._RunFiberLoop()
+
+    def _RunFiberLoop(self):
+        # Expects is_running to be set already; Run() sets it before starting the thread
+        monotonic = time.monotonic
+        ready_heap = self.ready_heap
+        cond = self.cond
+        while True:
+            with cond:
+                # Checked under the lock, so a Stop() between iterations is never missed
+                if not self.is_running:
                     break
-                elif fiber_info.activation_status == False:
+                if not ready_heap:
+                    cond.wait()
+                    continue
+                deadline, _, fiber_info = ready_heap[0]
+                now = monotonic()
+                delay = deadline - now
+                if delay > 0:
+                    # Woken early by ActivateFiber/Stop, or the deadline passed
+                    cond.wait(timeout=delay)
+                    continue
+                heapq.heappop(ready_heap)
+                fiber_info.scheduled = False
+                if not fiber_info.activation_status:
                     continue
-                elif (fiber_info.interval != None):
-                    if fiber_name not in self.fiber_last_trigger_time:
-                        self.fiber_last_trigger_time[fiber_name] = time.time()
-                    if (time.time() - self.fiber_last_trigger_time[fiber_name]) < fiber_info.interval:
-                        continue
 
-                self.fiber_last_trigger_time[fiber_name] = time.time()
+                fiber_info.last_trigger_time = now
+                fiber_info.stopped_event.clear()
                 fiber_info.running_status = True
-                if fiber_info.args == None:
-                    fiber_info.fiber()
-                else:
-                    fiber_info.fiber(fiber_info.args)
+
+            if fiber_info.args is None:
+                fiber_info.fiber()
+            else:
+                fiber_info.fiber(fiber_info.args)
+
+            with cond:
                 fiber_info.running_status = False
-                time.sleep(0.10)
+                fiber_info.stopped_event.set()
+                if fiber_info.activation_status:
+                    self._ScheduleFiber(fiber_info, now)
 
     def Run(self):
         DebugLog(LOG_DEBUG, 'Scheduler service started...')
-        self.fiber_scheduler_thread = threading.Thread(target=self.RunFiberLoop)
-        self.fiber_scheduler_thread.setDaemon(True)
+        # Set before the thread starts, so an early Stop() is not overwritten by the loop
+        with self.cond:
+            self.is_running = True
+        self.fiber_scheduler_thread = threading.Thread(target=self._RunFiberLoop, daemon=True)
         self.fiber_scheduler_thread.start()
 
     def Resume(self):
@@ -69,4 +139,9 @@ class FiberScheduler:
 
     def Stop(self):
         DebugLog(LOG_DEBUG, 'Scheduler service stopped...')
-        self.is_running = False
+        with self.cond:
+            self.is_running = False
+            self.cond.notify_all()
+        # Wait for the loop to exit, unless Stop was called from a fiber on the scheduler thread
+        if self.fiber_scheduler_thread is not None and self.fiber_scheduler_thread is not threading.current_thread():
+            self.fiber_scheduler_thread.join()
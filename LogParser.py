@@ -1,9 +1,11 @@
+import csv
 import re
 import sys
 
-error_warning_list ={ "Error" : [], "Warning" : [] }
-warning_exception_list = [ ]
-error_exception_list = [ ]
+# Captures the severity so lines can be classified without re-scanning the split fields
+WARNING_REGEX = re.compile(r"\b(Warning|Error):\s.*:\s")
+warning_exception_list = frozenset()
+error_exception_list = frozenset()
 
 def isExcept(code, exceptionList):
     if str(code) in exceptionList:
@@ -11,9 +13,14 @@ def isExcept(code, exceptionList):
     return False
 
 def parseWarningLog(fileName, outputFile):
-    with open(fileName) as warnings_log_file:
+    # Rows are written out as they are parsed, so memory stays flat for large logs
+    # The output is opened in text mode, so each "\n" row ending is written as the platform's line ending
+    with open(fileName) as warnings_log_file, open(outputFile, "w") as output_csv:
+        csv_writer = csv.writer(output_csv, lineterminator="\n")
+        csv_writer.writerow(("Code", "Message", "Details"))
         for line in warnings_log_file:
-            if re.search("Warning:\s.*:\s", line):
+            match = WARNING_REGEX.search(line)
+            if match:
                 split_list = line.split(": ")
                 if(len(split_list) == 4 ):
                     details = split_list[-4]
@@ -22,18 +29,12 @@ def parseWarningLog(fileName, outputFile):
                 code = split_list[-2].replace(' ', '')
                 if code == "":
                     code = "--"
-                message = "\"" + split_list[-1].replace("\n", '') + "\""
-                if "Warning" in split_list:
+                message = split_list[-1].replace("\n", '')
+                if match.group(1) == "Warning":
                     if not isExcept(code, warning_exception_list):
-                        error_warning_list["Warning"].append({"Code" : code, "Message" : message, "Details" : details})
-                elif "Error" in split_list:
-                    error_warning_list["Warning"].append({"Code" : code, "Message" : message, "Details" : details})
-
-    # Output to the .CSV file
-    with open(outputFile, "w") as output_csv:
-        output_csv.write("Code,Message,Details\n")
-        for item in error_warning_list["Warning"]:
-            output_csv.write(item["Code"] + "," + item["Message"] + "," + item["Details"] + "\n")
+                        csv_writer.writerow((code, message, details))
+                elif not isExcept(code, error_exception_list):
+                    csv_writer.writerow((code, message, details))
 
 if __name__=="__main__":
     if (len(sys.argv) != 5):
@@ -1,12 +1,78 @@
-import csv
+from bisect import bisect_right
 from datetime import datetime, timedelta
-import io
+import functools
+import json
 import logging
 import pandas
 import requests
+import urllib3
 import yfinance
 from sys import exit
 
+# Buffer size (bytes) for writing the output CSV
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# orjson is optional; fall back to the standard json module when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def parse_date(date_str: str) -> datetime:
+    """
+    Parses a date in 'MM-DD-YYYY' format. Faster than datetime.strptime for this fixed format.
+
+    Args:
+        date_str (str): The date; month and day may be unpadded.
+
+    Returns:
+        datetime: The parsed date. Raises ValueError if the date is malformed.
+    """
+    month, day, year = date_str.split('-')
+    return datetime(int(year), int(month), int(day))
+
+def format_date(date: datetime) -> str:
+    """
+    Formats a date (or pandas Timestamp) in 'MM-DD-YYYY' format without going through strftime.
+
+    Args:
+        date (datetime): The date to format.
+
+    Returns:
+        str: The formatted date.
+    """
+    return f"{date.month:02d}-{date.day:02d}-{date.year:04d}"
+
+def load_json(input_json_file):
+    """
+    Loads a JSON file, using orjson's faster parser when it is installed.
+
+    Args:
+        input_json_file (str): The name of the JSON file.
+
+    Returns:
+        The parsed JSON data.
+    """
+    if orjson is None:
+        with open(input_json_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers handle both the same way
+    with open(input_json_file, 'rb') as f:
+        return orjson.loads(f.read())
+
+def write_csv(data: pandas.DataFrame, output_csv_file: str):
+    """
+    Writes a DataFrame to a CSV file, without the index.
+
+    Args:
+        data (DataFrame): The data to write.
+        output_csv_file (str): The name of the output CSV file.
+    """
+    # A large write buffer lets the whole file go out in a few write calls.
+    # Rows end with '\r\n' on every platform, as csv.writer does.
+    with open(output_csv_file, mode='w', newline='', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as file:
+        data.to_csv(file, index=False, lineterminator='\r\n')
+
 class ForeignStock:
     """
     A class to fetch and analyze historical stock and currency exchange data.
@@ -30,6 +96,10 @@ class ForeignStock:
 
         # Get historical USD to INR rates
         self.exchanges_rates = self.fetch_usd_to_inr_rates(self.start_date, self.end_date)
+        # Sorted parallel arrays of rate dates and values for the nearest-previous-date lookups
+        sorted_rates = sorted((parse_date(date), rate) for date, rate in self.exchanges_rates.items())
+        self._rate_dates = [date for date, _ in sorted_rates]
+        self._rate_values = [rate for _, rate in sorted_rates]
 
         # Get historical stock prices
         self.stock_data = self.fetch_stock_price_data(ticker, self.start_date, self.end_date)
@@ -65,13 +135,13 @@ class ForeignStock:
             dict: A dictionary with dates as keys and USD to INR rates as values, or None on error.
         """
         try:
-            datetime.strptime(start_date, '%m-%d-%Y')
-            datetime.strptime(end_date, '%m-%d-%Y')
+            start_date_obj = parse_date(start_date)
+            end_date_obj = parse_date(end_date)
         except ValueError:
             raise RuntimeError("Invalid date format. Please use 'MM-DD-YYYY'.")
 
-        url_start_date = datetime.strptime(start_date, '%m-%d-%Y').strftime('%d-%m-%Y')
-        url_end_date = datetime.strptime(end_date, '%m-%d-%Y').strftime('%d-%m-%Y')
+        url_start_date = f"{start_date_obj.day:02d}-{start_date_obj.month:02d}-{start_date_obj.year:04d}"
+        url_end_date = f"{end_date_obj.day:02d}-{end_date_obj.month:02d}-{end_date_obj.year:04d}"
         url = f"https://www.nseindia.com/api/historicalOR/rbi-reference-rate-stats?from={url_start_date}&to={url_end_date}&csv=true"
 
         headers = {
@@ -81,23 +151,22 @@ class ForeignStock:
         try:
             with requests.get(url, headers=headers, stream=True, timeout=10) as response:
                 response.raise_for_status()
-                decoded_content = response.content.decode('utf-8-sig')
-                usd_to_inr_rates = {}
-                csv_file = io.StringIO(decoded_content)
-                csv_reader = csv.reader(csv_file)
-                next(csv_reader) # Skip header
-
-                for row in csv_reader:
-                    if len(row) > 1:
-                        try:
-                            trade_date = datetime.strptime(row[0].strip(), '%d-%b-%Y').strftime('%m-%d-%Y')
-                            usd_to_inr_rate = float(row[1].strip())
-                            usd_to_inr_rates[trade_date] = usd_to_inr_rate
-                        except (ValueError, IndexError) as e:
-                            self.logger.error(f"Skipping row due to data format error: {row}. Error: {e}")
+                # Parse straight from the response stream instead of buffering the whole body first.
+                # Only the first two columns (date and rate) are needed; parse them column-wise.
+                response.raw.decode_content = True
+                rates_data = pandas.read_csv(response.raw, encoding='utf-8-sig', usecols=[0, 1], header=0, names=['Date', 'Rate'], dtype=str).dropna(how='all')
+                trade_dates = pandas.to_datetime(rates_data['Date'].str.strip(), format='%d-%b-%Y', errors='coerce', cache=True)
+                rates = pandas.to_numeric(rates_data['Rate'].str.strip(), errors='coerce')
+
+                valid_rows = trade_dates.notna() & rates.notna()
+                for row in rates_data[~valid_rows].itertuples(index=False):
+                    self.logger.error(f"Skipping row due to data format error: {list(row)}.")
+
+                usd_to_inr_rates = dict(zip(trade_dates[valid_rows].dt.strftime('%m-%d-%Y'), rates[valid_rows].tolist()))
                 self.logger.debug(f"Fetched historical USD to INR rates from {start_date} to {end_date}.")
                 return usd_to_inr_rates
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+            # Errors while reading the body come straight from urllib3, as response.raw bypasses requests' translation
             raise RuntimeError(f"Error fetching exchange rates: {e}")
 
     def get_exchange_rate(self, date: str) -> float | None:
@@ -111,24 +180,56 @@ class ForeignStock:
             float or None: The rate for the given date, or None if not found.
         """
         try:
-            target_date = datetime.strptime(date, '%m-%d-%Y')
+            target_date = parse_date(date)
         except ValueError:
             raise RuntimeError("Invalid date format. Please use 'MM-DD-YYYY'.")
 
         if not self.exchanges_rates:
             raise RuntimeError("Rates data is not available.")
 
-        for _ in range(7):  # Check the target date and up to 6 previous days
-            current_date_str = target_date.strftime('%m-%d-%Y')
-            if current_date_str in self.exchanges_rates:
-                rate = self.exchanges_rates[current_date_str]
-                if _ > 0:
-                    self.logger.warning(f"Exchange rate not found for {date}. Using rate from nearest previous date: {current_date_str}.")
-                self.logger.debug(f"Exchange rate is ₹{rate} on {current_date_str}.")
-                return rate
-            target_date -= timedelta(days=1)
+        # Find the latest rate on or before the target date; accept it if it is within the preceding 6 days
+        index = bisect_right(self._rate_dates, target_date) - 1
+        if index < 0 or target_date - self._rate_dates[index] > timedelta(days=6):
+            raise RuntimeError(f"No rate found for {date} or in the preceding week.")
+
+        rate = self._rate_values[index]
+        current_date_str = format_date(self._rate_dates[index])
+        if self._rate_dates[index] != target_date:
+            self.logger.warning(f"Exchange rate not found for {date}. Using rate from nearest previous date: {current_date_str}.")
+        self.logger.debug(f"Exchange rate is ₹{rate} on {current_date_str}.")
+        return rate
+
+    def get_exchange_rates(self, dates: pandas.Series) -> pandas.Series:
+        """
+        Get the USD to INR rates for a series of dates, falling back to previous days if needed.
+        This is the vectorized counterpart of get_exchange_rate.
+
+        Args:
+            dates (Series): Dates as datetime values; missing dates (NaT) are allowed.
+
+        Returns:
+            Series: The rate for each date, or NaN where the date is missing.
+        """
+        if not self.exchanges_rates:
+            raise RuntimeError("Rates data is not available.")
+
+        rate_dates = pandas.DatetimeIndex(self._rate_dates)
+        valid_dates = pandas.DatetimeIndex(dates.dropna())
+        # Position of the latest rate on or before each date; -1 when there is none
+        indices = rate_dates.searchsorted(valid_dates, side='right') - 1
+        matched_dates = rate_dates[indices]
+        missing = (indices < 0) | (valid_dates - matched_dates > timedelta(days=6))
+        if missing.any():
+            raise RuntimeError(f"No rate found for {valid_dates[missing][0]:%m-%d-%Y} or in the preceding week.")
 
-        raise RuntimeError(f"No rate found for {date} or in the preceding week.")
+        fallback = valid_dates != matched_dates
+        # Warn once per distinct date, however many records share it
+        for date, matched_date in dict.fromkeys(zip(valid_dates[fallback], matched_dates[fallback])):
+            self.logger.warning(f"Exchange rate not found for {date:%m-%d-%Y}. Using rate from nearest previous date: {matched_date:%m-%d-%Y}.")
+
+        rates = pandas.Series(float('nan'), index=dates.index)
+        rates[dates.notna()] = [self._rate_values[index] for index in indices]
+        return rates
 
     def fetch_stock_price_data(self, ticker: str, start_date: str, end_date: str) -> pandas.DataFrame:
         """
@@ -143,16 +244,16 @@ class ForeignStock:
             DataFrame: Historical stock price data, or None on error.
         """
         try:
-            start_date_obj = datetime.strptime(start_date, '%m-%d-%Y')
+            start_date_obj = parse_date(start_date)
             # yfinance's end date is exclusive, so we add one day to get the end of the day.
-            end_date_obj = datetime.strptime(end_date, '%m-%d-%Y') + timedelta(days=1)
+            end_date_obj = parse_date(end_date) + timedelta(days=1)
         except ValueError:
             raise RuntimeError("Invalid date format. Please use 'MM-DD-YYYY'.")
 
         try:
             adjust_price = False
             self.logger.info(f"Note: Fetching {ticker} stock data with auto_adjust={adjust_price}.")
-            stock_data = yfinance.download(ticker, start=start_date_obj, end=end_date_obj, auto_adjust=adjust_price)
+            stock_data = yfinance.download(ticker, start=start_date_obj, end=end_date_obj, auto_adjust=adjust_price, progress=False, threads=False)
             if stock_data.empty:
                 raise RuntimeError(f"No data fetched for ticker {ticker}.")
             self.logger.debug(f"Fetched historical stock price data for {ticker} from {start_date} to {end_date}.")
@@ -160,49 +261,82 @@ class ForeignStock:
         except Exception as e:
             raise RuntimeError(f"Failed to fetch historical stock price data for {ticker}: {e}")
 
-    def find_peak_price(self) -> tuple[float, str]:
+    def get_price_column(self, column: str) -> pandas.Series:
         """
-        Find the peak price and corresponding date from the stock data.
+        Get a single price column (e.g., 'High' or 'Close') from the stock data.
+        yfinance may return the columns as a (price, ticker) MultiIndex; this flattens it.
+
+        Args:
+            column (str): Name of the price column.
 
         Returns:
-            tuple: Peak price and corresponding date, or (None, None) on error.
+            Series: Prices for the column, indexed by trading day.
+        """
+        prices = self.stock_data[column]
+        if isinstance(prices, pandas.DataFrame):
+            prices = prices.iloc[:, 0]
+        return prices
+
+    @functools.cached_property
+    def peak(self) -> tuple[float, str]:
+        """
+        Peak price and corresponding date, computed once from the stock data.
         """
         if self.stock_data is None or self.stock_data.empty:
             raise RuntimeError("No data available to determine the peak price.")
 
-        # pandas.Series.max() always returns a scalar, and pandas.Series.idxmax() returns a Timestamp
-        peak_price = self.stock_data['High'].max()
-        peak_date = self.stock_data['High'].idxmax()
-        # Ensure peak_price is a scalar value
-        if isinstance(peak_price, pandas.Series):
-            peak_price = peak_price.iloc[0]
-        # Ensure peak_date is a scalar value
-        if isinstance(peak_date, pandas.Series):
-            peak_date = peak_date.iloc[0].strftime('%m-%d-%Y')
+        high_prices = self.get_price_column('High')
+        peak_price = high_prices.max()
+        peak_date = format_date(high_prices.idxmax())
         self.logger.debug(f"Peak price found: ${peak_price:.2f} on {peak_date}.")
         return peak_price, peak_date
 
-    def find_closing_price(self) -> tuple[float, str]:
+    @functools.cached_property
+    def peak_exchange_rate(self) -> float:
         """
-        Find the closing price on the last available trading day.
+        USD to INR rate on the peak price date, looked up once.
+        """
+        return self.get_exchange_rate(self.peak[1])
 
-        Returns:
-            tuple: Closing price and the corresponding date, or (None, None) on error.
+    @functools.cached_property
+    def closing(self) -> tuple[float, str]:
+        """
+        Closing price and date of the last available trading day, computed once from the stock data.
         """
         if self.stock_data is None or self.stock_data.empty:
             raise RuntimeError("No data available to determine the closing price.")
 
-        last_trading_day_result = self.stock_data.index[-1]
-        if isinstance(last_trading_day_result, pandas.Series):
-            last_trading_day = last_trading_day_result.iloc[0]
-        else:
-            last_trading_day = last_trading_day_result
-
-        closing_price = self.stock_data.loc[last_trading_day, 'Close'].iloc[0]
-        closing_date = last_trading_day.strftime('%m-%d-%Y')
+        close_prices = self.get_price_column('Close')
+        closing_price = close_prices.iloc[-1]
+        closing_date = format_date(close_prices.index[-1])
         self.logger.debug(f"Closing price found: ${closing_price:.2f} on {closing_date}.")
         return closing_price, closing_date
 
+    @functools.cached_property
+    def closing_exchange_rate(self) -> float:
+        """
+        USD to INR rate on the closing price date, looked up once.
+        """
+        return self.get_exchange_rate(self.closing[1])
+
+    def find_peak_price(self) -> tuple[float, str]:
+        """
+        Find the peak price and corresponding date from the stock data.
+
+        Returns:
+            tuple: Peak price and corresponding date.
+        """
+        return self.peak
+
+    def find_closing_price(self) -> tuple[float, str]:
+        """
+        Find the closing price on the last available trading day.
+
+        Returns:
+            tuple: Closing price and the corresponding date.
+        """
+        return self.closing
+
 if __name__ == '__main__':
     # Example usage
     # Create an instance for the year 2024
@@ -1,8 +1,17 @@
-import csv
-from datetime import datetime
-from foreign_stock import ForeignStock
+from foreign_stock import ForeignStock, load_json, write_csv
 import json
+import numpy
 import os
+import pandas
+
+# Columns read from the input CSV and their types; any that are absent are treated as empty
+INPUT_COLUMNS = {
+    "Number of shares": "float64",
+    "Purchase date (MM/DD/YYYY)": "str",
+    "Purchase price (USD)": "float64",
+    "Sale date (MM/DD/YYYY)": "str",
+    "Sale price (USD)": "float64",
+}
 
 def find_start_and_end_years(input_csv_file):
     """
@@ -12,37 +21,55 @@ def find_start_and_end_years(input_csv_file):
         input_csv_file (str): The name of the input CSV file.
 
     Returns:
-        tuple: A tuple containing the start year and end year.
+        tuple: A tuple containing the start year, end year and the parsed CSV data. The data
+               holds the input columns typed as in INPUT_COLUMNS plus the parsed 'purchase_date'
+               and 'sale_date' columns, so it can be passed on to Form1.generate_form.
     """
     try:
-        with open(input_csv_file, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file)
-            all_dates = []
-            for row in csv_reader:
-                # Add purchase date
-                purchase_date_str = row.get("Purchase date (MM/DD/YYYY)")
-                if purchase_date_str:
-                    all_dates.append(datetime.strptime(purchase_date_str, '%m/%d/%Y'))
-                
-                # Add sale date if it exists
-                sale_date_str = row.get("Sale date (MM/DD/YYYY)")
-                if sale_date_str:
-                    all_dates.append(datetime.strptime(sale_date_str, '%m/%d/%Y'))
-            
-            if not all_dates:
-                return None, None
-            
-            min_date = min(all_dates)
-            max_date = max(all_dates)
-            
-            return min_date.year, max_date.year
+        # Only the known input columns are read; any other columns in the file are skipped while parsing
+        csv_data = pandas.read_csv(input_csv_file, usecols=lambda column: column in INPUT_COLUMNS, dtype=str, encoding='utf-8').reindex(columns=list(INPUT_COLUMNS))
+        # Numeric columns are converted separately, so a bad number is not reported as a bad date
+        for column, dtype in INPUT_COLUMNS.items():
+            if dtype != "str":
+                try:
+                    csv_data[column] = pandas.to_numeric(csv_data[column]).astype(dtype)
+                except ValueError as e:
+                    print(f"Error parsing '{column}': {e}. Please ensure it contains only numbers.")
+                    return None, None, None
+
+        csv_data["purchase_date"] = pandas.to_datetime(csv_data["Purchase date (MM/DD/YYYY)"], format='%m/%d/%Y')
+        csv_data["sale_date"] = pandas.to_datetime(csv_data["Sale date (MM/DD/YYYY)"], format='%m/%d/%Y')
+
+        all_dates = pandas.concat([csv_data["purchase_date"], csv_data["sale_date"]]).dropna()
+        if all_dates.empty:
+            return None, None, csv_data
+
+        min_date = all_dates.min()
+        max_date = all_dates.max()
+
+        return min_date.year, max_date.year, csv_data
 
     except FileNotFoundError:
         print(f"Error: The file '{input_csv_file}' was not found.")
-        return None, None
+        return None, None, None
     except ValueError as e:
             print(f"Error parsing dates: {e}. Please ensure dates are in 'MM/DD/YYYY' format.")
-            return None, None
+            return None, None, None
+
+def format_amounts(amounts):
+    """
+    Formats a series of amounts with two decimals.
+
+    Args:
+        amounts (Series): The amounts to format.
+
+    Returns:
+        Series: The formatted amounts, with missing or zero amounts left blank.
+    """
+    # Format the whole column in one vectorized pass, then blank out the missing/zero entries
+    values = amounts.to_numpy(dtype='float64')
+    formatted = numpy.char.mod('%.2f', values)
+    return pandas.Series(numpy.where(numpy.isnan(values) | (values == 0), "", formatted), index=amounts.index)
 
 class Form1:
     def __init__(self, ticker: str, start_date: str, end_date: str):
@@ -60,25 +87,19 @@ class Form1:
         self.fs = ForeignStock(ticker, start_date, end_date)
         self.ticker = ticker
 
-    def generate_form(self, input_json_file, input_csv_file, output_csv_file):
+    def generate_form(self, input_json_file, csv_data, output_csv_file):
         """
-        Reads a JSON file and a CSV file, then generates a new CSV file
-        by combining data from both sources.
+        Reads a JSON file and combines it with the parsed input CSV data
+        to generate a new CSV file.
 
         Args:
             input_json_file (str): The name of the input JSON file (e.g., 'form1.json').
-            input_csv_file (str): The name of the input CSV file (e.g., 'input.csv').
+            csv_data (DataFrame): The input CSV data as returned by find_start_and_end_years.
             output_file (str): The name of the output CSV file (e.g., 'form1.csv').
         """
         try:
             # Load data from the JSON file
-            with open(input_json_file, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-
-            # Load data from the CSV file into a list of dictionaries
-            with open(input_csv_file, 'r', encoding='utf-8') as csv_file:
-                csv_reader = csv.DictReader(csv_file)
-                csv_records = [row for row in csv_reader]
+            json_data = load_json(input_json_file)
 
             # Ensure required keys exist
             if "Output Header" not in json_data or not isinstance(json_data["Output Header"], list):
@@ -92,61 +113,43 @@ class Form1:
             output_header = json_data["Output Header"]
             ticker_template = json_data[self.ticker]
 
-            # Process each CSV record and generate the output records
-            final_records = []
-            for csv_record in csv_records:
-                print(f"--> Processing CSV record: {csv_record}")
-                # Create a new record dictionary for the output CSV
-                record = {}
-
-                # Populate the input data
-                num_shares = float(csv_record.get("Number of shares", None)) if csv_record.get("Number of shares", None) else None
-                purchase_date = csv_record.get("Purchase date (MM/DD/YYYY)", None) if csv_record.get("Purchase date (MM/DD/YYYY)", None) else None
-                purchase_price = float(csv_record.get("Purchase price (USD)", None)) if csv_record.get("Purchase price (USD)", None) else None
-                purchase_exchange_rate = self.fs.get_exchange_rate(datetime.strptime(purchase_date, '%m/%d/%Y').strftime('%m-%d-%Y')) if purchase_date else None
-                sale_date = csv_record.get("Sale date (MM/DD/YYYY)", None) if csv_record.get("Sale date (MM/DD/YYYY)", None) else None
-                sale_price = float(csv_record.get("Sale price (USD)", None)) if csv_record.get("Sale price (USD)", None) else None
-                sale_exchange_rate = self.fs.get_exchange_rate(datetime.strptime(sale_date, '%m/%d/%Y').strftime('%m-%d-%Y')) if sale_date else None
-
-                # Populate the output data in CSV record
-                for field in output_header:
-                    record[field] = ""
-
-                    # 1. Use values from the JSON template if available
-                    if field in ticker_template:
-                        record[field] = ticker_template[field]
-                    # 2. Use values from the input CSV for specific fields
-                    elif field == "Date of acquiring the interest" and purchase_date:
-                        record[field] = purchase_date
-                    elif field == "Initial value of the investment" and num_shares and purchase_price and purchase_exchange_rate:
-                        record[field] = f"{num_shares * purchase_price * purchase_exchange_rate:.2f}"
-                        print(f"Initial value calculated: ₹{record[field]} (Shares: {num_shares}, Purchase Price: ${purchase_price}, Exchange Rate: ₹{purchase_exchange_rate})")
-                    elif field == "Peak value of investment during the Period" and num_shares:
-                        peak_price, peak_date = self.fs.find_peak_price()
-                        exchange_rate = self.fs.get_exchange_rate(peak_date)
-                        record[field] = f"{num_shares * peak_price * exchange_rate:.2f}"
-                        print(f"Peak value calculated: ₹{record[field]} (Shares: {num_shares}, Peak Price: ${peak_price}, Exchange Rate: ₹{exchange_rate})")
-                    elif field == "Closing balance" and num_shares and not sale_date:
-                        closing_price, closing_date = self.fs.find_closing_price()
-                        exchange_rate = self.fs.get_exchange_rate(closing_date)
-                        record[field] = f"{num_shares * closing_price * exchange_rate:.2f}"
-                        print(f"Closing balance calculated: ₹{record[field]} (Shares: {num_shares}, Closing Price: ${closing_price}, Exchange Rate: ₹{exchange_rate})")
-                    elif field == "Total gross amount paid/credited with respect to the holding during the period":
-                        record[field] = ""
-                    elif field == "Total gross proceeds from sale or redemption of investment during the period" and num_shares and sale_price and sale_exchange_rate:
-                        record[field] = f"{num_shares * sale_price * sale_exchange_rate:.2f}"
-                        print(f"Gross proceeds calculated: ₹{record[field]} (Shares: {num_shares}, Sale Price: ${sale_price}, Exchange Rate: ₹{exchange_rate})")
-                    else:
-                        record[field] = ""
-
-                final_records.append(record)
-                print("--> Done processing record.\n")
-
-            # Open the CSV file in write mode
-            with open(output_csv_file, mode='w', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=output_header)
-                writer.writeheader()
-                writer.writerows(final_records)
+            # Populate the input data, one column per field
+            num_shares = csv_data["Number of shares"]
+            purchase_dates = csv_data["purchase_date"]
+            purchase_prices = csv_data["Purchase price (USD)"]
+            purchase_exchange_rates = self.fs.get_exchange_rates(purchase_dates)
+            sale_dates = csv_data["sale_date"]
+            sale_prices = csv_data["Sale price (USD)"]
+            sale_exchange_rates = self.fs.get_exchange_rates(sale_dates)
+
+            peak_price, peak_date = self.fs.find_peak_price()
+            peak_exchange_rate = self.fs.peak_exchange_rate
+            print(f"Peak price: ${peak_price} on {peak_date}, Exchange Rate: ₹{peak_exchange_rate}")
+            closing_price, closing_date = self.fs.find_closing_price()
+            closing_exchange_rate = self.fs.closing_exchange_rate
+            print(f"Closing price: ${closing_price} on {closing_date}, Exchange Rate: ₹{closing_exchange_rate}")
+
+            # Compute the derived columns for all records at once
+            computed_fields = {
+                "Date of acquiring the interest": csv_data["Purchase date (MM/DD/YYYY)"].fillna(""),
+                "Initial value of the investment": format_amounts(num_shares * purchase_prices * purchase_exchange_rates),
+                "Peak value of investment during the Period": format_amounts(num_shares * peak_price * peak_exchange_rate),
+                "Closing balance": format_amounts((num_shares * closing_price * closing_exchange_rate).where(sale_dates.isna())),
+                "Total gross proceeds from sale or redemption of investment during the period": format_amounts(num_shares * sale_prices * sale_exchange_rates),
+            }
+
+            # Populate the output data, giving values from the JSON template priority
+            output_data = pandas.DataFrame(index=csv_data.index)
+            for field in output_header:
+                if field in ticker_template:
+                    output_data[field] = ticker_template[field]
+                elif field in computed_fields:
+                    output_data[field] = computed_fields[field]
+                else:
+                    output_data[field] = ""
+            print(f"--> Processed {len(output_data)} CSV records.\n")
+
+            write_csv(output_data, output_csv_file)
 
             # Print a success message
             full_path = os.path.abspath(output_csv_file)
@@ -166,10 +169,14 @@ if __name__ == "__main__":
     ticker = input("Enter stock ticker symbol (e.g., 'MRVL'): ")
 
     # Find the start and end years from the CSV
-    start_year, end_year = find_start_and_end_years(csv_input_file)
+    # The parsed CSV data is reused by generate_form, so the file is read only once
+    start_year, end_year, csv_data = find_start_and_end_years(csv_input_file)
+    if start_year is None or end_year is None:
+        print(f"Error: Could not determine the start and end years from '{csv_input_file}'.")
+        exit(1)
 
     start_date = f"01-01-{start_year}"
     end_date = f"12-31-{end_year}"
     form1 = Form1(ticker, start_date, end_date)
 
-    form1.generate_form(json_file, csv_input_file, csv_output_file)
+    form1.generate_form(json_file, csv_data, csv_output_file)
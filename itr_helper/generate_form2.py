@@ -1,8 +1,24 @@
-import csv
-from datetime import datetime
-from foreign_stock import ForeignStock
+import argparse
+from foreign_stock import ForeignStock, load_json, write_csv
 import json
+import logging
+import numpy
 import os
+import pandas
+
+# Per-record calculation details are logged at DEBUG level; run with -v to see them
+logger = logging.getLogger(__name__)
+
+# Columns read from the input CSV; any that are absent are treated as empty
+INPUT_COLUMNS = [
+    "Number of shares",
+    "Purchase date (MM/DD/YYYY)",
+    "Purchase price (USD)",
+    "Sale date (MM/DD/YYYY)",
+    "Sale price (USD)",
+    "Bank transaction date (MM/DD/YYYY)",
+    "Amount credited in bank (INR)",
+]
 
 def find_start_and_end_years(input_csv_file):
     """
@@ -12,37 +28,98 @@ def find_start_and_end_years(input_csv_file):
         input_csv_file (str): The name of the input CSV file.
 
     Returns:
-        tuple: A tuple containing the start year and end year.
+        tuple: A tuple containing the start year, end year and the parsed CSV data. The data
+               holds the INPUT_COLUMNS as text (missing values are empty strings) plus the parsed
+               'purchase_date' and 'sale_date' columns, so it can be passed on to Form2.generate_form.
     """
     try:
-        with open(input_csv_file, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file)
-            all_dates = []
-            for row in csv_reader:
-                # Add purchase date
-                purchase_date_str = row.get("Purchase date (MM/DD/YYYY)")
-                if purchase_date_str:
-                    all_dates.append(datetime.strptime(purchase_date_str, '%m/%d/%Y'))
-                
-                # Add sale date if it exists
-                sale_date_str = row.get("Sale date (MM/DD/YYYY)")
-                if sale_date_str:
-                    all_dates.append(datetime.strptime(sale_date_str, '%m/%d/%Y'))
-            
-            if not all_dates:
-                return None, None
-            
-            min_date = min(all_dates)
-            max_date = max(all_dates)
-            
-            return min_date.year, max_date.year
+        # Keep the values as text, as they are passed through to the output unchanged.
+        # Only the known input columns are read; any other columns in the file are skipped while parsing.
+        csv_data = pandas.read_csv(input_csv_file, usecols=lambda column: column in INPUT_COLUMNS, dtype=str, keep_default_na=False, encoding='utf-8')
+        csv_data = csv_data.reindex(columns=INPUT_COLUMNS, fill_value="")
+        csv_data["purchase_date"] = pandas.to_datetime(csv_data["Purchase date (MM/DD/YYYY)"], format='%m/%d/%Y')
+        csv_data["sale_date"] = pandas.to_datetime(csv_data["Sale date (MM/DD/YYYY)"], format='%m/%d/%Y')
+
+        all_dates = pandas.concat([csv_data["purchase_date"], csv_data["sale_date"]]).dropna()
+        if all_dates.empty:
+            return None, None, csv_data
+
+        min_date = all_dates.min()
+        max_date = all_dates.max()
+
+        return min_date.year, max_date.year, csv_data
 
     except FileNotFoundError:
         print(f"Error: The file '{input_csv_file}' was not found.")
-        return None, None
+        return None, None, None
     except ValueError as e:
             print(f"Error parsing dates: {e}. Please ensure dates are in 'MM/DD/YYYY' format.")
-            return None, None
+            return None, None, None
+
+def to_numbers(texts):
+    """
+    Converts a column of text values to numbers.
+
+    Args:
+        texts (Series): The text values; empty strings mark missing values.
+
+    Returns:
+        Series: The numbers, with NaN for the missing values.
+    """
+    return pandas.to_numeric(texts.mask(texts == ""))
+
+def is_present(values):
+    """
+    Checks which values of a column are set, i.e. neither missing nor zero.
+
+    Args:
+        values (Series): The values to check.
+
+    Returns:
+        Series: True for each value that is set.
+    """
+    return values.notna() & (values != 0)
+
+def compute_amounts(num_shares, purchase_prices, purchase_exchange_rates, sale_prices, sale_exchange_rates, amounts_credited_in_bank):
+    """
+    Computes the derived amounts of all records. This is the arithmetic core of Form2;
+    it works on whole float64 arrays, so no per-record Python code runs.
+
+    Args:
+        num_shares (ndarray): Number of shares per record.
+        purchase_prices (ndarray): Purchase prices in USD.
+        purchase_exchange_rates (ndarray): USD to INR rates on the purchase dates.
+        sale_prices (ndarray): Sale prices in USD.
+        sale_exchange_rates (ndarray): USD to INR rates on the sale dates.
+        amounts_credited_in_bank (ndarray): Amounts credited in bank in INR.
+
+    Returns:
+        tuple: Purchase amounts (USD, INR), sale amounts (USD, INR), capital gains and differences.
+               Records with missing inputs get NaN.
+    """
+    purchase_amounts_usd = num_shares * purchase_prices
+    purchase_amounts_inr = purchase_amounts_usd * purchase_exchange_rates
+    sale_amounts_usd = num_shares * sale_prices
+    sale_amounts_inr = sale_amounts_usd * sale_exchange_rates
+    capital_gains = sale_amounts_inr - purchase_amounts_inr
+    differences = amounts_credited_in_bank - sale_amounts_inr
+    return purchase_amounts_usd, purchase_amounts_inr, sale_amounts_usd, sale_amounts_inr, capital_gains, differences
+
+def format_values(values, mask, value_format='%.2f'):
+    """
+    Formats a column of numbers.
+
+    Args:
+        values (Series or ndarray): The numbers to format.
+        mask (Series): True for each number that should be written.
+        value_format (str): The %-style format of a single number.
+
+    Returns:
+        Series: The formatted numbers, with the unmasked entries left blank.
+    """
+    # Format the whole column in one vectorized pass; unmasked entries are zeroed first so NaN is never formatted
+    values = numpy.where(mask, numpy.asarray(values, dtype='float64'), 0)
+    return pandas.Series(numpy.where(mask, numpy.char.mod(value_format, values), ""), index=mask.index)
 
 class Form2:
     def __init__(self, ticker: str, start_date: str, end_date: str):
@@ -60,25 +137,19 @@ class Form2:
         self.fs = ForeignStock(ticker, start_date, end_date)
         self.ticker = ticker
 
-    def generate_form(self, input_json_file, input_csv_file, output_csv_file):
+    def generate_form(self, input_json_file, csv_data, output_csv_file):
         """
-        Reads a JSON file and a CSV file, then generates a new CSV file
-        by combining data from both sources.
+        Reads a JSON file and combines it with the parsed input CSV data
+        to generate a new CSV file.
 
         Args:
             input_json_file (str): The name of the input JSON file (e.g., 'form1.json').
-            input_csv_file (str): The name of the input CSV file (e.g., 'input.csv').
+            csv_data (DataFrame): The input CSV data as returned by find_start_and_end_years.
             output_file (str): The name of the output CSV file (e.g., 'form1.csv').
         """
         try:
             # Load data from the JSON file
-            with open(input_json_file, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-
-            # Load data from the CSV file into a list of dictionaries
-            with open(input_csv_file, 'r', encoding='utf-8') as csv_file:
-                csv_reader = csv.DictReader(csv_file)
-                csv_records = [row for row in csv_reader]
+            json_data = load_json(input_json_file)
 
             # Ensure required keys exist
             if "Output Header" not in json_data or not isinstance(json_data["Output Header"], list):
@@ -88,76 +159,76 @@ class Form2:
             # Get CSV header fields for output
             output_header = json_data["Output Header"]
 
-            # Process each CSV record and generate the output records
-            final_records = []
-            for csv_record in csv_records:
-                print(f"--> Processing CSV record: {csv_record}")
-                # Create a new record dictionary for the output CSV
-                record = {}
-
-                # Populate the input data
-                num_shares = float(csv_record.get("Number of shares", None)) if csv_record.get("Number of shares", None) else None
-                purchase_date = csv_record.get("Purchase date (MM/DD/YYYY)", None) if csv_record.get("Purchase date (MM/DD/YYYY)", None) else None
-                purchase_price = float(csv_record.get("Purchase price (USD)", None)) if csv_record.get("Purchase price (USD)", None) else None
-                purchase_exchange_rate = self.fs.get_exchange_rate(datetime.strptime(purchase_date, '%m/%d/%Y').strftime('%m-%d-%Y')) if purchase_date else None
-                sale_date = csv_record.get("Sale date (MM/DD/YYYY)", None) if csv_record.get("Sale date (MM/DD/YYYY)", None) else None
-                sale_price = float(csv_record.get("Sale price (USD)", None)) if csv_record.get("Sale price (USD)", None) else None
-                sale_exchange_rate = self.fs.get_exchange_rate(datetime.strptime(sale_date, '%m/%d/%Y').strftime('%m-%d-%Y')) if sale_date else None
-                bank_transaction_date = csv_record.get("Bank transaction date (MM/DD/YYYY)", None) if csv_record.get("Bank transaction date (MM/DD/YYYY)", None) else None
-                amount_credited_in_bank = float(csv_record.get("Amount credited in bank (INR)", None)) if csv_record.get("Amount credited in bank (INR)", None) else None
-
-                # Populate the output data in CSV record
-                for field in output_header:
-                    record[field] = ""
-                    if field == "Number of shares" and num_shares:
-                        record[field] = str(num_shares)
-                    elif field == "Purchase date (MM/DD/YYYY)" and purchase_date:
-                        record[field] = purchase_date
-                    elif field == "Purchase price (USD)" and purchase_price:
-                        record[field] = str(purchase_price)
-                    elif field == "Purchase Amount (USD)" and num_shares and purchase_price:
-                        record[field] = f"{num_shares * purchase_price:.2f}"
-                    elif field == "USD to INR on purchase date" and purchase_exchange_rate:
-                        record[field] = f"{purchase_exchange_rate:.2f}"
-                    elif field == "Purchase amount (INR)" and num_shares and purchase_price and purchase_exchange_rate:
-                        record[field] = f"{num_shares * purchase_price * purchase_exchange_rate:.2f}"
-                        print(f"Purchase value calculated: ₹{record[field]} (Shares: {num_shares}, Purchase Price: ${purchase_price}, Exchange Rate: ₹{purchase_exchange_rate})")
-                    elif field == "Holding Days" and purchase_date and sale_date:
-                        record[field] = str((datetime.strptime(sale_date, '%m/%d/%Y') - datetime.strptime(purchase_date, '%m/%d/%Y')).days)
-                    elif field == "Sale date (MM/DD/YYYY)" and sale_date:
-                        record[field] = sale_date
-                    elif field == "Sale price (USD)" and sale_price:
-                        record[field] = str(sale_price)
-                    elif field == "Sale amount (USD)" and num_shares and sale_price:
-                        record[field] = f"{num_shares * sale_price:.2f}"
-                    elif field == "USD to INR on sale date" and sale_exchange_rate:
-                        record[field] = f"{sale_exchange_rate:.2f}"
-                    elif field == "Sale amount (INR)" and num_shares and sale_price and sale_exchange_rate:
-                        record[field] = f"{num_shares * sale_price * sale_exchange_rate:.2f}"
-                        print(f"Sale value calculated: ₹{record[field]} (Shares: {num_shares}, Sale Price: ${sale_price}, Exchange Rate: ₹{sale_exchange_rate})")
-                    elif field == "Bank transaction date (MM/DD/YYYY)" and bank_transaction_date:
-                        record[field] = bank_transaction_date
-                    elif field == "Capital gains (INR)" and num_shares and sale_price and sale_exchange_rate and purchase_price and purchase_exchange_rate:
-                        capital_gains = (num_shares * sale_price * sale_exchange_rate) - (num_shares * purchase_price * purchase_exchange_rate)
-                        record[field] = f"{capital_gains:.2f}"
-                        print(f"Capital gains calculated: ₹{record[field]} (Shares: {num_shares}, Sale Price: ${sale_price}, Sale Exchange Rate: ₹{sale_exchange_rate}, Purchase Price: ${purchase_price}, Purchase Exchange Rate: ₹{purchase_exchange_rate})")
-                    elif field == "Amount credited in bank (INR)" and amount_credited_in_bank:
-                        record[field] = str(amount_credited_in_bank)
-                    elif field == "Difference (INR)" and num_shares and sale_price and sale_exchange_rate and purchase_price and purchase_exchange_rate and amount_credited_in_bank:
-                        difference = amount_credited_in_bank - (num_shares * sale_price * sale_exchange_rate)
-                        record[field] = f"{difference:.2f}"
-                        print(f"Difference calculated: ₹{record[field]} (Amount Credited: ₹{amount_credited_in_bank}, Sale Value: ₹{num_shares * sale_price * sale_exchange_rate})")
-                    else:
-                        record[field] = ""
-
-                final_records.append(record)
-                print("--> Done processing record.\n")
-
-            # Open the CSV file in write mode
-            with open(output_csv_file, mode='w', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=output_header)
-                writer.writeheader()
-                writer.writerows(final_records)
+            # Populate the input data, one column per field
+            num_shares = to_numbers(csv_data["Number of shares"])
+            purchase_dates = csv_data["purchase_date"]
+            purchase_prices = to_numbers(csv_data["Purchase price (USD)"])
+            purchase_exchange_rates = self.fs.get_exchange_rates(purchase_dates)
+            sale_dates = csv_data["sale_date"]
+            sale_prices = to_numbers(csv_data["Sale price (USD)"])
+            sale_exchange_rates = self.fs.get_exchange_rates(sale_dates)
+            amounts_credited_in_bank = to_numbers(csv_data["Amount credited in bank (INR)"])
+
+            # Compute the derived amounts for all records at once, masking the records whose inputs are missing
+            has_shares = is_present(num_shares)
+            has_purchase_rate = is_present(purchase_exchange_rates)
+            has_sale_rate = is_present(sale_exchange_rates)
+            has_purchase_amount_usd = has_shares & is_present(purchase_prices)
+            has_purchase_amount_inr = has_purchase_amount_usd & has_purchase_rate
+            has_sale_amount_usd = has_shares & is_present(sale_prices)
+            has_sale_amount_inr = has_sale_amount_usd & has_sale_rate
+            has_capital_gains = has_purchase_amount_inr & has_sale_amount_inr
+            has_difference = has_capital_gains & is_present(amounts_credited_in_bank)
+            has_holding_days = purchase_dates.notna() & sale_dates.notna()
+
+            (purchase_amounts_usd, purchase_amounts_inr, sale_amounts_usd, sale_amounts_inr,
+             capital_gains, differences) = compute_amounts(num_shares.to_numpy(dtype='float64'),
+                                                           purchase_prices.to_numpy(dtype='float64'),
+                                                           purchase_exchange_rates.to_numpy(dtype='float64'),
+                                                           sale_prices.to_numpy(dtype='float64'),
+                                                           sale_exchange_rates.to_numpy(dtype='float64'),
+                                                           amounts_credited_in_bank.to_numpy(dtype='float64'))
+            holding_days = (sale_dates - purchase_dates).dt.days
+
+            # Input values are passed through as they appear in the input CSV
+            computed_fields = {
+                "Number of shares": csv_data["Number of shares"].where(has_shares, ""),
+                "Purchase date (MM/DD/YYYY)": csv_data["Purchase date (MM/DD/YYYY)"],
+                "Purchase price (USD)": csv_data["Purchase price (USD)"].where(is_present(purchase_prices), ""),
+                "Purchase Amount (USD)": format_values(purchase_amounts_usd, has_purchase_amount_usd),
+                "USD to INR on purchase date": format_values(purchase_exchange_rates, has_purchase_rate),
+                "Purchase amount (INR)": format_values(purchase_amounts_inr, has_purchase_amount_inr),
+                "Holding Days": format_values(holding_days, has_holding_days, '%d'),
+                "Sale date (MM/DD/YYYY)": csv_data["Sale date (MM/DD/YYYY)"],
+                "Sale price (USD)": csv_data["Sale price (USD)"].where(is_present(sale_prices), ""),
+                "Sale amount (USD)": format_values(sale_amounts_usd, has_sale_amount_usd),
+                "USD to INR on sale date": format_values(sale_exchange_rates, has_sale_rate),
+                "Sale amount (INR)": format_values(sale_amounts_inr, has_sale_amount_inr),
+                "Bank transaction date (MM/DD/YYYY)": csv_data["Bank transaction date (MM/DD/YYYY)"],
+                "Capital gains (INR)": format_values(capital_gains, has_capital_gains),
+                "Amount credited in bank (INR)": csv_data["Amount credited in bank (INR)"].where(is_present(amounts_credited_in_bank), ""),
+                "Difference (INR)": format_values(differences, has_difference),
+            }
+
+            if logger.isEnabledFor(logging.DEBUG):
+                for index, csv_record in enumerate(csv_data[INPUT_COLUMNS].to_dict('records')):
+                    logger.debug("--> Processing CSV record: %s", csv_record)
+                    if has_purchase_amount_inr.iloc[index]:
+                        logger.debug("Purchase value calculated: ₹%.2f (Shares: %s, Purchase Price: $%s, Exchange Rate: ₹%s)", purchase_amounts_inr[index], num_shares.iloc[index], purchase_prices.iloc[index], purchase_exchange_rates.iloc[index])
+                    if has_sale_amount_inr.iloc[index]:
+                        logger.debug("Sale value calculated: ₹%.2f (Shares: %s, Sale Price: $%s, Exchange Rate: ₹%s)", sale_amounts_inr[index], num_shares.iloc[index], sale_prices.iloc[index], sale_exchange_rates.iloc[index])
+                    if has_capital_gains.iloc[index]:
+                        logger.debug("Capital gains calculated: ₹%.2f (Shares: %s, Sale Price: $%s, Sale Exchange Rate: ₹%s, Purchase Price: $%s, Purchase Exchange Rate: ₹%s)", capital_gains[index], num_shares.iloc[index], sale_prices.iloc[index], sale_exchange_rates.iloc[index], purchase_prices.iloc[index], purchase_exchange_rates.iloc[index])
+                    if has_difference.iloc[index]:
+                        logger.debug("Difference calculated: ₹%.2f (Amount Credited: ₹%s, Sale Value: ₹%s)", differences[index], amounts_credited_in_bank.iloc[index], sale_amounts_inr[index])
+                    logger.debug("--> Done processing record.\n")
+
+            # Populate the output data; fields that cannot be computed are left empty
+            output_data = pandas.DataFrame(index=csv_data.index)
+            for field in output_header:
+                output_data[field] = computed_fields.get(field, "")
+
+            write_csv(output_data, output_csv_file)
 
             # Print a success message
             full_path = os.path.abspath(output_csv_file)
@@ -167,6 +238,15 @@ class Form2:
             print(f"Error: Could not decode JSON from the file '{input_json_file}'. Please check the file's format.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the capital gains CSV (form2) from the input trades.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print per-record calculation details.")
+    args = parser.parse_args()
+    if args.verbose:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+
     json_file = "input/form2.json"
     csv_input_file = "input/input.csv"
     csv_output_file = "output/form2.csv"
@@ -177,10 +257,14 @@ if __name__ == "__main__":
     ticker = input("Enter stock ticker symbol (e.g., 'MRVL'): ")
 
     # Find the start and end years from the CSV
-    start_year, end_year = find_start_and_end_years(csv_input_file)
+    # The parsed CSV data is reused by generate_form, so the file is read only once
+    start_year, end_year, csv_data = find_start_and_end_years(csv_input_file)
+    if start_year is None or end_year is None:
+        print(f"Error: Could not determine the start and end years from '{csv_input_file}'.")
+        exit(1)
 
     start_date = f"01-01-{start_year}"
     end_date = f"12-31-{end_year}"
     form2 = Form2(ticker, start_date, end_date)
 
-    form2.generate_form(json_file, csv_input_file, csv_output_file)
+    form2.generate_form(json_file, csv_data, csv_output_file)
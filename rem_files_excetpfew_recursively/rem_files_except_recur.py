@@ -1,13 +1,65 @@
-import os
-import sys
-
-# Traverse all directories recursively and delete all the files except .efi and .pdb
-for root, dirs, files in os.walk(sys.argv[1]):
-    for file in files:
-        full_path = os.path.join(root, file)
-        if (not full_path.endswith('.efi')) and (not full_path.endswith('.pdb')):
-            try:
-                os.remove(full_path)
-            except FileNotFoundError:
-                # We hit this exception due to longer file path. So skipping
-                pass
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+
+# Files whose names end with these suffixes are kept; everything else is deleted
+KEEP_EXTENSIONS = ('.efi', '.pdb')
+
+# Number of threads issuing deletions while the tree is being scanned
+DELETE_WORKERS = 16
+
+# Maximum number of deletions queued or running at once, so memory stays flat however many files the tree holds
+MAX_PENDING_DELETES = DELETE_WORKERS * 4
+
+def to_long_path(path):
+    # On Windows, use the extended-length path prefix so paths longer than MAX_PATH (260 characters)
+    # can be listed and deleted. Paths found under the prefixed root inherit the prefix.
+    if os.name != 'nt' or path.startswith('\\\\?\\'):
+        return path
+    path = os.path.abspath(path)
+    if path.startswith('\\\\'):
+        # UNC path: \\server\share -> \\?\UNC\server\share
+        return '\\\\?\\UNC\\' + path[2:]
+    return '\\\\?\\' + path
+
+def find_files_to_remove(path):
+    # Traverse all directories recursively and yield all the files except .efi and .pdb.
+    # scandir entries carry the file type from the directory listing, so no extra stat calls are needed.
+    try:
+        entries = os.scandir(path)
+    except OSError:
+        # Like os.walk, directories that cannot be listed (e.g. no permission) are skipped
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir():
+                # Like os.walk, symlinked directories are neither followed nor removed
+                if not entry.is_symlink():
+                    yield from find_files_to_remove(entry.path)
+            elif not entry.name.endswith(KEEP_EXTENSIONS):
+                yield entry.path
+
+def remove_file(full_path):
+    try:
+        os.remove(full_path)
+    except FileNotFoundError:
+        # The file was removed by someone else after it was listed. So skipping
+        pass
+
+# Deletions are handed to worker threads so unlink calls overlap with each other and with the scan.
+# Finished deletions are collected as the scan goes, and the oldest is waited on once MAX_PENDING_DELETES are queued,
+# so any unexpected error from a worker is re-raised promptly.
+with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+    pending = deque()
+    try:
+        for full_path in find_files_to_remove(to_long_path(sys.argv[1])):
+            while pending and (pending[0].done() or len(pending) >= MAX_PENDING_DELETES):
+                pending.popleft().result()
+            pending.append(executor.submit(remove_file, full_path))
+        while pending:
+            pending.popleft().result()
+    except BaseException:
+        # Drop the queued deletions instead of running them before the error is reported
+        executor.shutdown(cancel_futures=True)
+        raise